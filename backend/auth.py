@@ -13,9 +13,13 @@ from backend import models
 SECRET_KEY = "CHANGE_ME_DEV_SECRET"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+# Stream tickets end up in URLs (and so in access logs); keep them short-lived and stream-only
+STREAM_TICKET_EXPIRE_SECONDS = 60
+STREAM_TICKET_SCOPE = "events"
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 def get_db():
     db = SessionLocal()
@@ -37,17 +41,25 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def create_stream_ticket(user: models.User) -> str:
+    return create_access_token({"sub": str(user.id), "scope": STREAM_TICKET_SCOPE}, timedelta(seconds=STREAM_TICKET_EXPIRE_SECONDS))
+
+def user_from_token(token: Optional[str], db: Session, scope: Optional[str] = None) -> models.User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if not token:
+        raise credentials_exception
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: int = int(payload.get("sub"))
         if user_id is None:
             raise credentials_exception
+        # Access tokens carry no scope; a stream ticket is only good for the stream
+        if payload.get("scope") != scope:
+            raise credentials_exception
     except JWTError:
         raise credentials_exception
     user = db.get(models.User, user_id)
@@ -55,6 +67,15 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise credentials_exception
     return user
 
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    return user_from_token(token, db)
+
+def get_current_user_for_stream(ticket: Optional[str] = None, header_token: Optional[str] = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)):
+    # Browsers' EventSource can't set headers, so it passes a ticket from POST /events/ticket as ?ticket=
+    if header_token:
+        return user_from_token(header_token, db)
+    return user_from_token(ticket, db, scope=STREAM_TICKET_SCOPE)
+
 def require_role(*roles: models.Role):
     def dep(user: models.User = Depends(get_current_user)):
         if user.role not in roles:
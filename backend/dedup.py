@@ -0,0 +1,137 @@
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from backend import models
+
+# Max differing bits (of 63) for two receipt photos to count as the same receipt
+DUPLICATE_MAX_DISTANCE = 10
+# How far back each sync re-reads, to catch rows whose transactions committed late
+SYNC_OVERLAP = timedelta(minutes=5)
+
+_SIGN_BIT = 1 << 63
+
+def to_signed64(h: int) -> int:
+    return h - (1 << 64) if h >= _SIGN_BIT else h
+
+def to_unsigned64(h: int) -> int:
+    return h + (1 << 64) if h < 0 else h
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance: radius searches visit only a fraction of the nodes."""
+
+    def __init__(self):
+        self._root = None  # [hash, items, {distance: child}]
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, h: int, item):
+        self._size += 1
+        if self._root is None:
+            self._root = [h, [item], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = child
+
+    def search(self, h: int, max_distance: int) -> List[Tuple[object, int]]:
+        """Return (item, distance) pairs within `max_distance` of `h`, closest first."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance:
+                found.extend((item, d) for item in node[1])
+            # Triangle inequality: only children keyed within [d - r, d + r] can hold matches
+            for k, child in node[2].items():
+                if d - max_distance <= k <= d + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda x: x[1])
+        return found
+
+class _CompanyIndex:
+    def __init__(self):
+        self.tree = BKTree()
+        self.seen: Set[int] = set()
+        self.watermark: Optional[datetime] = None  # newest created_at read so far
+        self.lock = threading.Lock()
+
+class ReceiptIndex:
+    """Per-company BK-trees of receipt hashes, topped up from receipt_hashes on each lookup.
+
+    Only rows attached to an expense are indexed; OCR previews that were never
+    submitted stay out of the tree.
+
+    Each sync re-reads rows created within SYNC_OVERLAP of the newest row already
+    seen. Ids are not assumed to commit in order, so a row inserted earlier but
+    committed later (by this or another worker) is still picked up.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[Tuple[str, int], _CompanyIndex] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, db: Session, company_id: int) -> _CompanyIndex:
+        key = (str(db.get_bind().url), company_id)
+        with self._lock:
+            return self._indexes.setdefault(key, _CompanyIndex())
+
+    def _sync(self, db: Session, company_id: int) -> _CompanyIndex:
+        index = self._index(db, company_id)
+        with index.lock:
+            since = index.watermark
+        q = db.query(models.ReceiptHash.id, models.ReceiptHash.phash, models.ReceiptHash.created_at).filter(
+            models.ReceiptHash.company_id == company_id,
+            models.ReceiptHash.expense_id.isnot(None),
+        )
+        if since is not None:
+            q = q.filter(models.ReceiptHash.created_at >= since - SYNC_OVERLAP)
+        rows = q.all()
+        with index.lock:
+            for rid, phash, created_at in rows:
+                if rid not in index.seen:
+                    index.seen.add(rid)
+                    index.tree.add(to_unsigned64(phash), rid)
+                if index.watermark is None or created_at > index.watermark:
+                    index.watermark = created_at
+        return index
+
+    def near(self, db: Session, company_id: int, phash: int, max_distance: int = DUPLICATE_MAX_DISTANCE) -> List[Tuple[int, int]]:
+        """(receipt_id, distance) for the company's receipts within `max_distance` bits of `phash`."""
+        index = self._sync(db, company_id)
+        with index.lock:
+            return index.tree.search(to_unsigned64(phash), max_distance)
+
+receipt_index = ReceiptIndex()
+
+def find_duplicate_expense(db: Session, receipt: models.ReceiptHash, amount: float, currency_code: str, on_date: date) -> Optional[int]:
+    """Id of an earlier expense whose receipt looks like `receipt` and whose amount and date match."""
+    matches = receipt_index.near(db, receipt.company_id, receipt.phash)
+    if not matches:
+        return None
+    distance = dict(matches)
+    candidates = db.query(models.ReceiptHash.id, models.Expense.id, models.Expense.amount).join(
+        models.Expense, models.ReceiptHash.expense_id == models.Expense.id
+    ).filter(
+        models.ReceiptHash.id.in_(list(distance)),
+        models.Expense.currency_code == currency_code.upper(),
+        models.Expense.date == on_date,
+    ).all()
+    same_amount = [(distance[rid], eid) for rid, eid, amt in candidates if abs(amt - amount) < 0.005]
+    return min(same_amount)[1] if same_amount else None
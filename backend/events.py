@@ -0,0 +1,288 @@
+"""Per-user push events for the approvals UI.
+
+Route handlers call `hub.publish(user_id, event, data)` after committing; the
+`/events/stream` endpoint relays each user's events to their browser as
+server-sent events. Delivery between workers goes through a pluggable backend:
+the default only reaches subscribers in this process, and `RedisBackend` fans
+out across workers. Select one with EVENTS_BACKEND, either "redis://..." or
+"package.module:factory"; it is resolved when this module is imported, so a bad
+value fails the worker at startup.
+
+Events are best-effort: a failing backend is logged and never fails the request
+that published.
+"""
+import abc
+import asyncio
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Set
+
+# Per-subscriber queue bound; a client that falls this far behind is told to resync
+QUEUE_SIZE = 100
+# Comment frame sent on idle streams so proxies don't time the connection out
+HEARTBEAT_SECONDS = 15.0
+# After the backend fails to start, publishes are dropped for this long before it is tried again
+RETRY_SECONDS = 10.0
+
+logger = logging.getLogger("backend.events")
+
+Deliver = Callable[[int, str], None]
+Lost = Callable[[BaseException], None]
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class Backend(abc.ABC):
+    """Transport for published messages.
+
+    Must call `deliver` for every message, including local ones, and `lost` if it
+    stops delivering (say its connection dropped) so the hub can restart it.
+    """
+
+    @abc.abstractmethod
+    def start(self, deliver: Deliver, lost: Lost):
+        ...
+
+    @abc.abstractmethod
+    def publish(self, user_id: int, message: str):
+        ...
+
+    def close(self):
+        pass
+
+class LocalBackend(Backend):
+    """Single-process delivery."""
+
+    def start(self, deliver: Deliver, lost: Lost):
+        self._deliver = deliver
+
+    def publish(self, user_id: int, message: str):
+        self._deliver(user_id, message)
+
+class RedisBackend(Backend):
+    """Redis pub/sub fan-out for multi-worker deployments (requires the `redis` package)."""
+
+    prefix = "expense-events:"
+    # Publishing runs inside requests that have already committed, so give up quickly
+    connect_timeout = 1.0
+    socket_timeout = 2.0
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def start(self, deliver: Deliver, lost: Lost):
+        import redis
+
+        client = redis.Redis.from_url(self.url, socket_connect_timeout=self.connect_timeout, socket_timeout=self.socket_timeout)
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+
+            def on_message(msg):
+                user_id = int(msg["channel"].decode()[len(self.prefix):])
+                deliver(user_id, msg["data"].decode())
+
+            def on_error(exc, pubsub, thread):
+                # Without a handler redis-py re-raises and the listener thread dies silently
+                thread.stop()
+                lost(exc)
+
+            pubsub.psubscribe(**{self.prefix + "*": on_message})
+            thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=on_error)
+        except Exception:
+            client.close()
+            raise
+        self._client, self._thread = client, thread
+
+    def publish(self, user_id: int, message: str):
+        self._client.publish(f"{self.prefix}{user_id}", message)
+
+    def close(self):
+        self._thread.stop()
+        self._client.close()
+
+def backend_from_env() -> Backend:
+    spec = os.getenv("EVENTS_BACKEND", "")
+    if not spec:
+        return LocalBackend()
+    if spec.startswith(("redis://", "rediss://")):
+        return RedisBackend(spec)
+    module, _, attr = spec.partition(":")
+    if not module or not attr:
+        raise ValueError(f"EVENTS_BACKEND must be a redis:// URL or 'package.module:factory', got {spec!r}")
+    return getattr(importlib.import_module(module), attr)()
+
+class Subscription:
+    """One open stream. `put` is safe to call from any thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+        self.closed = False
+
+    def _put(self, message: str):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def put(self, message: str):
+        try:
+            self._loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            pass  # the stream's event loop has already shut down
+
+    def _wake(self):
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait("")
+
+    def close(self):
+        """End the stream; safe to call from any thread or a signal handler."""
+        self.closed = True
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            pass
+
+    def drain(self):
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self.overflowed = False
+
+    async def get(self, timeout: float) -> Optional[str]:
+        """Next message, or None if nothing arrived within `timeout` seconds."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class EventHub:
+    def __init__(self, backend: Optional[Backend] = None):
+        self._backend = backend if backend is not None else backend_from_env()
+        self._started = False
+        self._retry_at = 0.0
+        self._resync = False
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        # Separate from _lock so a slow backend start never holds up delivery
+        self._start_lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def start(self) -> bool:
+        """Start the backend unless it is running, returning whether it is.
+
+        Blocking (it may connect), so call it off the event loop. After a failed
+        start no new attempt is made for RETRY_SECONDS. Open streams are told to
+        resync after a restart, since events may have been missed meanwhile.
+        """
+        with self._start_lock:
+            if self._started:
+                return True
+            if time.monotonic() < self._retry_at:
+                return False
+            try:
+                self._backend.start(self._deliver, self._lost)
+            except Exception:
+                logger.exception("Event backend failed to start; retrying in %.0fs", RETRY_SECONDS)
+                self._retry_at = time.monotonic() + RETRY_SECONDS
+                return False
+            self._started = True
+            resync, self._resync = self._resync, False
+        if resync:
+            with self._lock:
+                subs = [sub for user_subs in self._subscribers.values() for sub in user_subs]
+            for sub in subs:
+                sub.put(format_sse("resync", {}))
+        return True
+
+    def _lost(self, exc: BaseException):
+        """Called by the backend, from any thread, once it has stopped delivering."""
+        with self._start_lock:
+            if not self._started:
+                return
+            logger.error("Event backend stopped delivering (%s); restarting on next use", exc)
+            self._started = False
+            self._resync = True
+            try:
+                self._backend.close()
+            except Exception:
+                logger.exception("Could not close the event backend")
+
+    def publish(self, user_id: int, event: str, data: dict):
+        if not self.start():
+            logger.debug("Event backend down; dropped %s for user %s", event, user_id)
+            return
+        try:
+            self._backend.publish(user_id, format_sse(event, data))
+        except Exception as exc:
+            logger.exception("Could not publish %s to user %s", event, user_id)
+            self._lost(exc)
+
+    def _deliver(self, user_id: int, message: str):
+        with self._lock:
+            subs = list(self._subscribers.get(user_id, ()))
+        for sub in subs:
+            sub.put(message)
+
+    def subscribe(self, user_id: int) -> Subscription:
+        sub = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, user_id: int, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(user_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self, user_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(user_id, ()))
+
+    def close_streams(self):
+        """End every open stream, e.g. when the server is shutting down."""
+        with self._lock:
+            subs = [sub for user_subs in self._subscribers.values() for sub in user_subs]
+        for sub in subs:
+            sub.close()
+
+    def close(self):
+        with self._start_lock:
+            if self._started:
+                self._started = False
+                self._backend.close()
+
+hub = EventHub()
+
+async def stream_events(user_id: int):
+    """Yield SSE frames for `user_id` until the client disconnects or `hub.close_streams()` is called."""
+    sub = hub.subscribe(user_id)
+    try:
+        yield "retry: 3000\n\n" + format_sse("ready", {"user_id": user_id})
+        while True:
+            message = await sub.get(HEARTBEAT_SECONDS)
+            if sub.closed:
+                return
+            if sub.overflowed:
+                sub.drain()
+                yield format_sse("resync", {})
+            elif message is None:
+                if not hub.started:
+                    # The backend died; restarting it resyncs this and every other open stream
+                    await asyncio.to_thread(hub.start)
+                yield ": keep-alive\n\n"
+            else:
+                yield message
+    finally:
+        hub.unsubscribe(user_id, sub)
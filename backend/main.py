@@ -1,20 +1,51 @@
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload, selectinload
 from datetime import date, datetime
 from typing import List, Optional
-from PIL import Image
+import asyncio
 import io
+import signal
+import threading
 
-from backend.database import Base, engine, SessionLocal
 from backend import models
 from backend import schemas
-from backend.auth import get_db, get_password_hash, verify_password, create_access_token, get_current_user, require_role
+from backend.auth import get_db, get_password_hash, verify_password, create_access_token, create_stream_ticket, get_current_user, get_current_user_for_stream, require_role, STREAM_TICKET_EXPIRE_SECONDS
 from backend.currency import get_company_currency_for_country, convert
 from backend.workflow import evaluate_rules, advance_sequence_if_needed
-from backend.ocr import ocr_text, detect_currency_and_amount
+from backend.ocr import ocr_text, detect_currency_and_amount, perceptual_hash
+from backend.dedup import find_duplicate_expense, to_signed64
+from backend.profiling import QueryProfilerMiddleware, query_budget
+from backend.events import hub, stream_events
 
-app = FastAPI(title="Expense Approvals API")
+def close_streams_on_exit_signal():
+    # uvicorn waits for open responses to finish before it runs the lifespan shutdown,
+    # so event streams have to end as soon as the exit signal (Ctrl+C, --reload) arrives
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            hub.close_streams()
+            previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    close_streams_on_exit_signal()
+    await asyncio.to_thread(hub.start)
+    yield
+    hub.close_streams()
+    await asyncio.to_thread(hub.close)
+
+app = FastAPI(title="Expense Approvals API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,12 +54,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-Base.metadata.create_all(bind=engine)
+app.add_middleware(QueryProfilerMiddleware)
 
 # ---- Auth & Bootstrap ----
 
 @app.post("/auth/signup", response_model=schemas.TokenResponse)
+@query_budget(4)
 def signup(payload: schemas.SignupRequest, db: Session = Depends(get_db)):
     # Create Company
     currency = get_company_currency_for_country(payload.country_code)
@@ -55,6 +86,7 @@ def signup(payload: schemas.SignupRequest, db: Session = Depends(get_db)):
     return schemas.TokenResponse(access_token=token)
 
 @app.post("/auth/login", response_model=schemas.TokenResponse)
+@query_budget(1)
 def login(payload: schemas.LoginRequest, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.email == payload.email).first()
     if not user or not verify_password(payload.password, user.password_hash):
@@ -63,12 +95,14 @@ def login(payload: schemas.LoginRequest, db: Session = Depends(get_db)):
     return schemas.TokenResponse(access_token=token)
 
 @app.get("/auth/me", response_model=schemas.UserOut)
+@query_budget(1)
 def me(user: models.User = Depends(get_current_user)):
     return user
 
 # ---- Admin: Users & Rules ----
 
 @app.post("/admin/users", response_model=schemas.UserOut)
+@query_budget(4)
 def create_user(payload: schemas.CreateUserRequest, admin: models.User = Depends(require_role(models.Role.admin)), db: Session = Depends(get_db)):
     if db.query(models.User).filter(models.User.email == payload.email).first():
         raise HTTPException(status_code=400, detail="Email already exists")
@@ -87,10 +121,12 @@ def create_user(payload: schemas.CreateUserRequest, admin: models.User = Depends
     return user
 
 @app.get("/admin/users", response_model=List[schemas.UserOut])
+@query_budget(2)
 def list_users(admin: models.User = Depends(require_role(models.Role.admin)), db: Session = Depends(get_db)):
     return db.query(models.User).filter(models.User.company_id == admin.company_id).all()
 
 @app.post("/admin/rules", response_model=schemas.ApprovalRuleOut)
+@query_budget(3)
 def create_rule(payload: schemas.ApprovalRuleCreate, admin: models.User = Depends(require_role(models.Role.admin)), db: Session = Depends(get_db)):
     rule = models.ApprovalRule(
         company_id=admin.company_id,
@@ -104,6 +140,7 @@ def create_rule(payload: schemas.ApprovalRuleCreate, admin: models.User = Depend
     return rule
 
 @app.get("/admin/rules", response_model=List[schemas.ApprovalRuleOut])
+@query_budget(2)
 def list_rules(admin: models.User = Depends(require_role(models.Role.admin)), db: Session = Depends(get_db)):
     return db.query(models.ApprovalRule).filter(models.ApprovalRule.company_id == admin.company_id).all()
 
@@ -128,9 +165,18 @@ def build_sequence_for_expense(db: Session, employee: models.User) -> list[model
     return steps
 
 @app.post("/expenses", response_model=schemas.ExpenseOut)
+@query_budget(13)
 def submit_expense(payload: schemas.ExpenseCreate, user: models.User = Depends(require_role(models.Role.employee, models.Role.manager, models.Role.admin)), db: Session = Depends(get_db)):
     company = db.get(models.Company, user.company_id)
     normalized = convert(payload.amount, payload.currency_code, company.currency_code)
+    # Flag (don't block) a claim whose receipt photo, amount and date match an earlier one
+    receipt = None
+    duplicate_of_id = None
+    if payload.receipt_id is not None:
+        receipt = db.get(models.ReceiptHash, payload.receipt_id)
+        if not receipt or receipt.company_id != user.company_id:
+            raise HTTPException(status_code=404, detail="Receipt not found")
+        duplicate_of_id = find_duplicate_expense(db, receipt, payload.amount, payload.currency_code, payload.date)
     exp = models.Expense(
         employee_id=user.id,
         amount=payload.amount,
@@ -140,27 +186,40 @@ def submit_expense(payload: schemas.ExpenseCreate, user: models.User = Depends(r
         description=payload.description,
         date=payload.date,
         status=models.ExpenseStatus.pending,
+        duplicate_of_id=duplicate_of_id,
     )
     db.add(exp)
     db.flush()
+    if receipt is not None:
+        # A fresh row per claim: the OCR preview stays unattached and out of the duplicate index
+        db.add(models.ReceiptHash(company_id=receipt.company_id, expense_id=exp.id, phash=receipt.phash))
     # Build steps
     steps = build_sequence_for_expense(db, user)
-    for s in steps:
-        s.expense_id = exp.id
-        db.add(s)
+    if steps:
+        # One multi-row INSERT instead of a round trip per step
+        db.execute(insert(models.ExpenseApprovalStep), [
+            {"expense_id": exp.id, "approver_user_id": s.approver_user_id, "sequence": s.sequence} for s in steps
+        ])
     db.commit()
     db.refresh(exp)
     advance_sequence_if_needed(exp)
     db.commit()
+    # Push the new expense to its owner and to every approver now holding a pending step
+    out = schemas.ExpenseOut.model_validate(exp).model_dump(mode="json")
+    hub.publish(exp.employee_id, "expense.updated", out)
+    for approver_id in {s.approver_user_id for s in steps}:
+        hub.publish(approver_id, "pending.updated", out)
     return exp
 
 @app.get("/expenses/my", response_model=List[schemas.ExpenseOut])
+@query_budget(2)
 def my_expenses(user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     return db.query(models.Expense).filter(models.Expense.employee_id == user.id).order_by(models.Expense.created_at.desc()).all()
 
 # ---- Approvals ----
 
 @app.get("/approvals/pending", response_model=List[schemas.ExpenseOut])
+@query_budget(3)
 def pending_for_me(user: models.User = Depends(require_role(models.Role.manager, models.Role.admin)), db: Session = Depends(get_db)):
     step_q = db.query(models.ExpenseApprovalStep).filter(
         models.ExpenseApprovalStep.approver_user_id == user.id,
@@ -173,36 +232,43 @@ def pending_for_me(user: models.User = Depends(require_role(models.Role.manager,
     return exps
 
 @app.post("/approvals/{expense_id}/act", response_model=schemas.ExpenseOut)
+@query_budget(8)
 def act_on_expense(expense_id: int, payload: schemas.StepAction, user: models.User = Depends(require_role(models.Role.manager, models.Role.admin)), db: Session = Depends(get_db)):
-    exp = db.get(models.Expense, expense_id)
+    # evaluate_rules reads employee and steps; load them up front rather than lazily
+    exp = db.get(models.Expense, expense_id, options=[joinedload(models.Expense.employee), selectinload(models.Expense.steps)])
     if not exp:
         raise HTTPException(status_code=404, detail="Expense not found")
 
     # Find my pending step
-    step = db.query(models.ExpenseApprovalStep).filter(
-        models.ExpenseApprovalStep.expense_id == expense_id,
-        models.ExpenseApprovalStep.approver_user_id == user.id,
-        models.ExpenseApprovalStep.status == models.StepDecision.pending
-    ).order_by(models.ExpenseApprovalStep.sequence).first()
-
-    if not step:
+    mine = [s for s in exp.steps if s.approver_user_id == user.id and s.status == models.StepDecision.pending]
+    if not mine:
         raise HTTPException(status_code=400, detail="No pending step for this user")
+    step = min(mine, key=lambda s: s.sequence)
 
     step.status = models.StepDecision.approved if payload.approve else models.StepDecision.rejected
     step.comment = payload.comment
     step.decided_at = datetime.utcnow()
-    db.commit()
+    actor_id = user.id
 
     # Evaluate rules & advance
     evaluate_rules(db, exp)
     advance_sequence_if_needed(exp)
     db.commit()
     db.refresh(exp)
+
+    out = schemas.ExpenseOut.model_validate(exp).model_dump(mode="json")
+    hub.publish(exp.employee_id, "expense.updated", out)
+    still_pending = {s.approver_user_id for s in exp.steps if s.status == models.StepDecision.pending}
+    for approver_id in still_pending:
+        hub.publish(approver_id, "pending.updated", out)
+    if actor_id not in still_pending:
+        hub.publish(actor_id, "pending.removed", {"id": exp.id})
     return exp
 
 @app.get("/expenses/{expense_id}/steps", response_model=List[schemas.StepOut])
+@query_budget(3)
 def list_steps(expense_id: int, user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    exp = db.get(models.Expense, expense_id)
+    exp = db.get(models.Expense, expense_id, options=[joinedload(models.Expense.employee)])
     if not exp:
         raise HTTPException(status_code=404, detail="Expense not found")
     # Visibility: employee or any approver/admin in same company
@@ -211,12 +277,41 @@ def list_steps(expense_id: int, user: models.User = Depends(get_current_user), d
     steps = db.query(models.ExpenseApprovalStep).filter(models.ExpenseApprovalStep.expense_id == expense_id).order_by(models.ExpenseApprovalStep.sequence).all()
     return steps
 
+# ---- Events ----
+
+@app.post("/events/ticket", response_model=schemas.StreamTicket)
+@query_budget(1)
+def event_ticket(user: models.User = Depends(get_current_user)):
+    # Short-lived credential for /events/stream?ticket=, so the bearer token never goes in a URL
+    return schemas.StreamTicket(ticket=create_stream_ticket(user), expires_in=STREAM_TICKET_EXPIRE_SECONDS)
+
+@app.get("/events/stream")
+@query_budget(1)
+async def event_stream(user: models.User = Depends(get_current_user_for_stream)):
+    # Deltas for the caller's own expenses and pending approvals; replaces polling the list endpoints
+    if not hub.started and not await asyncio.to_thread(hub.start):
+        raise HTTPException(status_code=503, detail="Live updates unavailable")
+    return StreamingResponse(
+        stream_events(user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # ---- OCR ----
 
 @app.post("/ocr/parse", response_model=schemas.OCRResult)
-def parse_receipt(file: UploadFile = File(...)):
+@query_budget(2)
+def parse_receipt(file: UploadFile = File(...), user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    from PIL import Image
+
     content = file.file.read()
     img = Image.open(io.BytesIO(content)).convert("RGB")
     text = ocr_text(img)
     currency, amount = detect_currency_and_amount(text)
-    return schemas.OCRResult(amount=amount, currency_code=currency, raw_text=text)
+    # Remember the receipt's perceptual hash so a later submission can be checked for duplicates
+    receipt = models.ReceiptHash(company_id=user.company_id, phash=to_signed64(perceptual_hash(img)))
+    db.add(receipt)
+    db.flush()
+    receipt_id = receipt.id
+    db.commit()
+    return schemas.OCRResult(amount=amount, currency_code=currency, raw_text=text, receipt_id=receipt_id)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Float, Date, DateTime, Text, Enum
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, Boolean, Float, Date, DateTime, Text, Enum
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime
 from backend.database import Base
@@ -52,6 +52,7 @@ class Expense(Base):
     status: Mapped[ExpenseStatus] = mapped_column(Enum(ExpenseStatus), default=ExpenseStatus.pending)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     current_step_index: Mapped[int] = mapped_column(Integer, default=0)
+    duplicate_of_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("expenses.id"), nullable=True)  # likely duplicate claim
 
     employee = relationship("User")
     steps = relationship("ExpenseApprovalStep", back_populates="expense", cascade="all, delete-orphan")
@@ -89,3 +90,13 @@ class ApprovalRule(Base):
 
     company = relationship("Company", back_populates="approval_rules")
     specific_user = relationship("User")
+
+class ReceiptHash(Base):
+    __tablename__ = "receipt_hashes"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    company_id: Mapped[int] = mapped_column(Integer, ForeignKey("companies.id"), index=True)
+    expense_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("expenses.id"), nullable=True)
+    phash: Mapped[int] = mapped_column(BigInteger, nullable=False)  # 64-bit perceptual hash stored as signed
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    expense = relationship("Expense")
@@ -1,9 +1,10 @@
-from typing import Optional, Tuple
+from typing import Optional, Tuple, TYPE_CHECKING
 import re
-import numpy as np
-import cv2
-import pytesseract
-from PIL import Image
+
+# cv2, numpy, pytesseract and PIL are imported on first use so that API workers
+# which never parse a receipt don't pay for loading them.
+if TYPE_CHECKING:
+    from PIL import Image
 
 CURRENCY_SYMBOLS = {
     "$": "USD",
@@ -24,7 +25,11 @@ ISO_CODES = {"USD","EUR","GBP","INR","JPY","KRW","RUB","BRL","CAD","AUD","NZD","
 
 TOTAL_HINTS = ["total", "amount due", "grand total", "balance due", "amount", "sum"]
 
-def preprocess_for_ocr(img: Image.Image) -> Image.Image:
+def preprocess_for_ocr(img: "Image.Image") -> "Image.Image":
+    import cv2
+    import numpy as np
+    from PIL import Image
+
     # Convert to OpenCV
     arr = np.array(img)
     if arr.ndim == 3:
@@ -39,7 +44,9 @@ def preprocess_for_ocr(img: Image.Image) -> Image.Image:
     proc = cv2.morphologyEx(th, cv2.MORPH_OPEN, kernel)
     return Image.fromarray(proc)
 
-def ocr_text(img: Image.Image) -> str:
+def ocr_text(img: "Image.Image") -> str:
+    import pytesseract
+
     proc = preprocess_for_ocr(img)
     # Configure tesseract to look for numbers + currency symbols predominantly
     config = "--oem 3 --psm 6"
@@ -104,3 +111,15 @@ def detect_currency_and_amount(text: str) -> Tuple[Optional[str], Optional[float
         amount = scored_candidates[0][2]
 
     return currency, amount
+
+def perceptual_hash(img: "Image.Image") -> int:
+    """63-bit DCT perceptual hash; photos of the same receipt differ in only a few bits."""
+    import cv2
+    import numpy as np
+
+    gray = np.asarray(img.convert("L"), dtype=np.float32)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+    # Keep the lowest 8x8 frequencies minus the DC term (overall brightness) and compare each against their median
+    ac = cv2.dct(small)[:8, :8].flatten()[1:]
+    bits = ac > np.median(ac)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
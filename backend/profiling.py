@@ -0,0 +1,151 @@
+"""Per-route SQL query profiling.
+
+Every statement executed while a request is in flight is attributed to that
+request's route via a context variable. Routes declare an upper bound with
+`@query_budget(n)`; statement shapes repeated within one request are reported as
+N+1 candidates.
+
+Tests wrap requests in `profile_queries()` and call `assert_clean()`. At runtime,
+set QUERY_PROFILE=1 to log budget overruns and N+1 candidates instead.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("backend.queries")
+
+N_PLUS_ONE_THRESHOLD = 3
+
+# Bound parameter in any DBAPI paramstyle: qmark ?, format %s, pyformat %(id_1_1)s,
+# named/numeric :id_1_1 or :1, and $1
+_PARAM = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_IN_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    """Collapse whitespace and expanded IN lists so equivalent statements compare equal, whatever the paramstyle."""
+    return _IN_LIST.sub("(?)", _SPACE.sub(" ", statement).strip())
+
+@dataclass
+class RequestProfile:
+    route: Optional[str] = None
+    budget: Optional[int] = None
+    statements: List[str] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        shapes = Counter(statement_shape(s) for s in self.statements)
+        return {shape: n for shape, n in shapes.items() if n >= threshold}
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_query_profile", default=None)
+_sinks: List[Callable[[RequestProfile], None]] = []
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is not None:
+        profile.statements.append(statement)
+
+def query_budget(max_queries: int):
+    """Declare the maximum number of SQL statements a route may execute per request."""
+    def decorator(fn):
+        fn.__query_budget__ = max_queries
+        return fn
+    return decorator
+
+class QueryProfilerMiddleware:
+    """ASGI middleware that opens a RequestProfile per HTTP request while any sink is registered."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _sinks:
+            await self.app(scope, receive, send)
+            return
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                profile.route = f"{scope['method']} {route.path}"
+                profile.budget = getattr(route.endpoint, "__query_budget__", None)
+            else:
+                profile.route = f"{scope['method']} {scope['path']}"
+            for sink in list(_sinks):
+                sink(profile)
+
+class QueryProfiler:
+    """Collects request profiles and reports budget overruns and N+1 candidates."""
+
+    def __init__(self, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.threshold = n_plus_one_threshold
+        self.profiles: List[RequestProfile] = []
+
+    def __call__(self, profile: RequestProfile):
+        self.profiles.append(profile)
+
+    def for_route(self, route: str) -> List[RequestProfile]:
+        return [p for p in self.profiles if p.route == route]
+
+    def over_budget(self) -> List[RequestProfile]:
+        return [p for p in self.profiles if p.over_budget]
+
+    def n_plus_one(self) -> Dict[str, Dict[str, int]]:
+        found: Dict[str, Dict[str, int]] = {}
+        for p in self.profiles:
+            for shape, n in p.repeated(self.threshold).items():
+                route = found.setdefault(p.route, {})
+                route[shape] = max(route.get(shape, 0), n)
+        return found
+
+    def report(self) -> List[str]:
+        lines = [f"{p.route}: {p.count} queries (budget {p.budget})" for p in self.over_budget()]
+        for route, shapes in self.n_plus_one().items():
+            for shape, n in shapes.items():
+                lines.append(f"{route}: possible N+1, {n}x {shape}")
+        return lines
+
+    def assert_clean(self):
+        problems = self.report()
+        if problems:
+            raise QueryBudgetExceeded("\n".join(problems))
+
+@contextmanager
+def profile_queries(n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+    profiler = QueryProfiler(n_plus_one_threshold)
+    _sinks.append(profiler)
+    try:
+        yield profiler
+    finally:
+        _sinks.remove(profiler)
+
+def _log_profile(profile: RequestProfile):
+    if profile.over_budget:
+        logger.warning("%s executed %d queries (budget %d)", profile.route, profile.count, profile.budget)
+    for shape, n in profile.repeated().items():
+        logger.warning("%s possible N+1: %dx %s", profile.route, n, shape)
+
+if os.getenv("QUERY_PROFILE") == "1":
+    _sinks.append(_log_profile)
@@ -48,6 +48,7 @@ class ExpenseCreate(BaseModel):
     category: str
     description: Optional[str] = None
     date: date
+    receipt_id: Optional[int] = None  # from /ocr/parse; enables duplicate detection
 
 class ExpenseOut(BaseModel):
     id: int
@@ -60,6 +61,7 @@ class ExpenseOut(BaseModel):
     date: date
     status: str
     current_step_index: int
+    duplicate_of_id: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -98,7 +100,12 @@ class ApprovalRuleOut(BaseModel):
     class Config:
         from_attributes = True
 
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int  # seconds
+
 class OCRResult(BaseModel):
     amount: Optional[float]
     currency_code: Optional[str]
     raw_text: str
+    receipt_id: Optional[int] = None
@@ -0,0 +1,248 @@
+"""In-process load benchmark for the Expense Approvals API.
+
+    python -m benchmarks.load --companies 4 --users 200 --requests 200 --out bench.json
+    python -m benchmarks.load --baseline bench.json --tolerance 0.25
+
+Seeds a throwaway SQLite database with synthetic tenants, stubs the FX/country
+lookups (and Tesseract unless --real-ocr), drives `backend.main.app` through
+httpx's ASGI transport and reports latency percentiles and throughput for every
+route. With --baseline the run exits non-zero when any route regresses.
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import platform
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from PIL import Image, ImageDraw
+
+from benchmarks.synthetic import BENCH_PASSWORD, Dataset, Scale, seeded_app
+
+# (method, path, request kwargs)
+Call = Tuple[str, str, dict]
+
+# Long-lived responses have no meaningful request latency; they are left out of the workload
+STREAMING_ROUTES = {"GET /events/stream"}
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an unsorted sample list."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def summarize(latencies: List[float], errors: int, wall: float) -> dict:
+    ms = [x * 1000.0 for x in latencies]
+    return {
+        "count": len(ms),
+        "errors": errors,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+        "throughput_rps": round(len(ms) / wall, 2) if wall > 0 else 0.0,
+    }
+
+def receipt_png() -> bytes:
+    img = Image.new("RGB", (480, 220), "white")
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(["ACME STORE", "Coffee   3.50", "Sandwich 8.75", "TOTAL  $12.25"]):
+        draw.text((20, 20 + i * 45), line, fill="black")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+def build_workload(data: Dataset) -> Dict[str, Callable[[int], Optional[Call]]]:
+    """Map each route to a factory producing the i-th request against the seeded data.
+
+    A factory returns None once the seeded data for its route is used up; that
+    route then reports fewer than the requested number of samples.
+    """
+    tenants = data.tenants
+    admins = [t.admin_id for t in tenants]
+    employees = [uid for t in tenants for uid in t.employee_ids] or admins
+    approvers = [uid for t in tenants for uid in t.manager_ids] or admins
+    expenses = [eid for t in tenants for eid in t.expense_ids]
+    expense_owner = {eid: uid for t in tenants for eid, uid in t.expense_owner.items()}
+    pending = [p for t in tenants for p in t.pending]
+    receipt = receipt_png()
+    run = datetime.utcnow().strftime("%H%M%S%f")
+
+    def auth(uid: int) -> dict:
+        return {"Authorization": "Bearer " + data.tokens[uid]}
+
+    def pick(seq: list, i: int):
+        return seq[i % len(seq)]
+
+    def act(i: int) -> Optional[Call]:
+        # Each seeded pending step can be decided once; stop rather than re-act on decided steps
+        if i >= len(pending):
+            return None
+        expense_id, approver_id = pending[i]
+        return "POST", f"/approvals/{expense_id}/act", {"headers": auth(approver_id), "json": {"approve": True, "comment": "bench"}}
+
+    def steps(i: int) -> Call:
+        eid = pick(expenses, i)
+        return "GET", f"/expenses/{eid}/steps", {"headers": auth(expense_owner[eid])}
+
+    return {
+        "POST /auth/signup": lambda i: ("POST", "/auth/signup", {"json": {
+            "email": f"signup.{run}.{i}@bench.example.com", "full_name": "Bench Signup", "password": BENCH_PASSWORD,
+            "company_name": f"Signup Co {i}", "country_code": "US"}}),
+        "POST /auth/login": lambda i: ("POST", "/auth/login", {"json": {
+            "email": data.emails[pick(employees, i)], "password": BENCH_PASSWORD}}),
+        "GET /auth/me": lambda i: ("GET", "/auth/me", {"headers": auth(pick(employees, i))}),
+        "POST /admin/users": lambda i: ("POST", "/admin/users", {"headers": auth(pick(admins, i)), "json": {
+            "email": f"new.{run}.{i}@bench.example.com", "full_name": "Bench New", "password": BENCH_PASSWORD,
+            "role": "employee", "manager_id": None, "is_manager_approver": False}}),
+        "GET /admin/users": lambda i: ("GET", "/admin/users", {"headers": auth(pick(admins, i))}),
+        "POST /admin/rules": lambda i: ("POST", "/admin/rules", {"headers": auth(pick(admins, i)), "json": {
+            "type": "percentage", "threshold_percent": 60, "specific_user_id": None}}),
+        "GET /admin/rules": lambda i: ("GET", "/admin/rules", {"headers": auth(pick(admins, i))}),
+        "POST /expenses": lambda i: ("POST", "/expenses", {"headers": auth(pick(employees, i)), "json": {
+            "amount": 42.5 + i % 100, "currency_code": ("USD", "EUR", "GBP")[i % 3], "category": "Meals",
+            "description": "bench", "date": "2024-06-01"}}),
+        "GET /expenses/my": lambda i: ("GET", "/expenses/my", {"headers": auth(pick(employees, i))}),
+        "GET /approvals/pending": lambda i: ("GET", "/approvals/pending", {"headers": auth(pick(approvers, i))}),
+        "POST /approvals/{expense_id}/act": act,
+        "GET /expenses/{expense_id}/steps": steps,
+        "POST /events/ticket": lambda i: ("POST", "/events/ticket", {"headers": auth(pick(employees, i))}),
+        "POST /ocr/parse": lambda i: ("POST", "/ocr/parse", {"headers": auth(pick(employees, i)), "files": {"file": ("receipt.png", receipt, "image/png")}}),
+    }
+
+async def drive(client: httpx.AsyncClient, factory: Callable[[int], Optional[Call]], requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        while True:
+            i = next(counter)
+            if i >= requests:
+                return
+            call = factory(i)
+            if call is None:
+                return
+            method, path, kwargs = call
+            start = time.perf_counter()
+            resp = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+async def _run(app, data: Dataset, requests: int, concurrency: int, only: Optional[List[str]]) -> Dict[str, dict]:
+    workload = build_workload(data)
+    results: Dict[str, dict] = {}
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, factory in workload.items():
+            if only and name not in only:
+                continue
+            results[name] = await drive(client, factory, requests, concurrency)
+    return results
+
+def run_benchmark(scale: Scale, requests: int = 50, concurrency: int = 4, real_ocr: bool = False,
+                  only: Optional[List[str]] = None) -> dict:
+    """Seed a scratch database at `scale`, exercise every route and return a JSON-able report."""
+    seed_start = time.perf_counter()
+    with seeded_app(scale, real_ocr=real_ocr) as (app, data):
+        seed_seconds = time.perf_counter() - seed_start
+        endpoints = asyncio.run(_run(app, data, requests, concurrency, only))
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": asdict(scale),
+            "requests_per_endpoint": requests,
+            "concurrency": concurrency,
+            "real_ocr": real_ocr,
+            "seed_seconds": round(seed_seconds, 3),
+        },
+        "endpoints": endpoints,
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2) -> List[str]:
+    """Return human-readable regressions of `current` against `baseline`."""
+    regressions = []
+    for name, base in baseline.get("endpoints", {}).items():
+        cur = current.get("endpoints", {}).get(name)
+        if cur is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if base[key] > 0 and cur[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key} {base[key]:.2f} -> {cur[key]:.2f}")
+        if base["throughput_rps"] > 0 and cur["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput_rps {base['throughput_rps']:.2f} -> {cur['throughput_rps']:.2f}")
+        if cur["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {cur['errors']}")
+    return regressions
+
+def format_table(report: dict) -> str:
+    header = f"{'endpoint':<36}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}"
+    lines = [header, "-" * len(header)]
+    for name, r in report["endpoints"].items():
+        lines.append(f"{name:<36}{r['count']:>6}{r['errors']:>5}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['throughput_rps']:>10.1f}")
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = Scale()
+    p = argparse.ArgumentParser(description="Load benchmark for the Expense Approvals API")
+    p.add_argument("--companies", type=int, default=defaults.companies)
+    p.add_argument("--users", type=int, default=defaults.users_per_company, help="users per company")
+    p.add_argument("--fanout", type=int, default=defaults.manager_fanout, help="direct reports per manager")
+    p.add_argument("--depth", type=int, default=defaults.manager_depth, help="manager tree depth")
+    p.add_argument("--rules", type=int, default=defaults.rules_per_company, help="approval rules per company")
+    p.add_argument("--expenses", type=int, default=defaults.expenses_per_user, help="seeded expenses per user")
+    p.add_argument("--steps", type=int, default=defaults.steps_per_expense, help="approval steps per seeded expense")
+    p.add_argument("--seed", type=int, default=defaults.seed)
+    p.add_argument("--requests", type=int, default=50, help="requests per endpoint")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--endpoint", action="append", help="only run this endpoint (repeatable), e.g. 'GET /auth/me'")
+    p.add_argument("--real-ocr", action="store_true", help="call the real Tesseract binary")
+    p.add_argument("--out", help="write the JSON report to this path")
+    p.add_argument("--baseline", help="JSON report from a previous run to compare against")
+    p.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before flagging")
+    args = p.parse_args(argv)
+
+    scale = Scale(
+        companies=args.companies, users_per_company=args.users, manager_fanout=args.fanout,
+        manager_depth=args.depth, rules_per_company=args.rules, expenses_per_user=args.expenses,
+        steps_per_expense=args.steps, seed=args.seed,
+    )
+    report = run_benchmark(scale, requests=args.requests, concurrency=args.concurrency,
+                           real_ocr=args.real_ocr, only=args.endpoint)
+    print(format_table(report), file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(report, json.load(fh), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
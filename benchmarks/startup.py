@@ -0,0 +1,113 @@
+"""Cold-boot benchmark for an API worker.
+
+    python -m benchmarks.startup --runs 20 --out startup.json
+    python -m benchmarks.startup --baseline startup.json --tolerance 0.25
+
+Each run starts a fresh interpreter and imports `backend.main`, recording the
+import time, the whole process wall time and which heavy optional modules
+(OpenCV, NumPy, Tesseract, Pillow) ended up loaded.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from benchmarks.load import percentile
+
+HEAVY_MODULES = ("cv2", "numpy", "pytesseract", "PIL")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import backend.main
+elapsed = time.perf_counter() - t
+print(json.dumps({"import_s": elapsed, "heavy": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+def boot_once(env: dict) -> dict:
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+    probe = json.loads(out.stdout.strip().splitlines()[-1])
+    probe["wall_s"] = wall
+    return probe
+
+def _stats(seconds: List[float]) -> dict:
+    ms = [s * 1000.0 for s in seconds]
+    return {
+        "min_ms": round(min(ms), 3),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+def run_startup(runs: int = 10) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        # Bytecode goes to a private cache: the warm-up boot fills it, so every sample loads
+        # cached bytecode whatever state the source tree is in, and nothing is written there
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+                   PYTHONPYCACHEPREFIX=os.path.join(tmp, "pycache"))
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        boot_once(env)
+        samples = [boot_once(env) for _ in range(runs)]
+        db_created = os.path.exists(os.path.join(tmp, "startup.db"))
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": runs,
+        },
+        "import": _stats([s["import_s"] for s in samples]),
+        "process": _stats([s["wall_s"] for s in samples]),
+        "heavy_modules_loaded": sorted({m for s in samples for m in s["heavy"]}),
+        "database_touched_on_import": db_created,
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.2) -> List[str]:
+    regressions = []
+    for section in ("import", "process"):
+        base, cur = baseline[section]["p50_ms"], current[section]["p50_ms"]
+        if base > 0 and cur > base * (1 + tolerance):
+            regressions.append(f"{section}: p50_ms {base:.1f} -> {cur:.1f}")
+    added = set(current["heavy_modules_loaded"]) - set(baseline["heavy_modules_loaded"])
+    if added:
+        regressions.append("heavy modules now loaded at import: " + ", ".join(sorted(added)))
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Cold worker boot benchmark")
+    p.add_argument("--runs", type=int, default=10)
+    p.add_argument("--out", help="write the JSON report to this path")
+    p.add_argument("--baseline", help="JSON report from a previous run to compare against")
+    p.add_argument("--tolerance", type=float, default=0.2)
+    args = p.parse_args(argv)
+
+    report = run_startup(args.runs)
+    print(f"import  p50 {report['import']['p50_ms']:.1f} ms  p95 {report['import']['p95_ms']:.1f} ms", file=sys.stderr)
+    print(f"process p50 {report['process']['p50_ms']:.1f} ms  p95 {report['process']['p95_ms']:.1f} ms", file=sys.stderr)
+    print(f"heavy modules loaded: {', '.join(report['heavy_modules_loaded']) or 'none'}", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w") as fh:
+            json.dump(report, fh, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(report, json.load(fh), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, selectinload, sessionmaker
+
+from backend import models
+from backend.database import Base
+from backend.auth import get_db, get_password_hash, create_access_token
+
+BENCH_PASSWORD = "bench-pass"
+CATEGORIES = ["Meals", "Travel", "Lodging", "Supplies", "Software", "Training"]
+CURRENCIES = ["USD", "EUR", "GBP", "INR", "JPY"]
+
+# Fixed USD-based table; cross rates are derived so conversions stay consistent.
+USD_RATES = {"USD": 1.0, "EUR": 0.92, "GBP": 0.79, "INR": 83.1, "JPY": 149.5}
+COUNTRY_CURRENCY = {"US": "USD", "DE": "EUR", "FR": "EUR", "GB": "GBP", "IN": "INR", "JP": "JPY"}
+
+@dataclass
+class Scale:
+    companies: int = 2
+    users_per_company: int = 50
+    manager_fanout: int = 5       # direct reports per manager in the tree
+    manager_depth: int = 2        # levels of managers below the admin
+    rules_per_company: int = 2
+    expenses_per_user: int = 5
+    steps_per_expense: int = 3
+    seed: int = 1307
+
+@dataclass
+class Tenant:
+    company_id: int
+    admin_id: int
+    manager_ids: List[int] = field(default_factory=list)
+    employee_ids: List[int] = field(default_factory=list)
+    expense_ids: List[int] = field(default_factory=list)
+    expense_owner: Dict[int, int] = field(default_factory=dict)  # expense_id -> employee_id
+    # (expense_id, approver_user_id) pairs with a pending step
+    pending: List[Tuple[int, int]] = field(default_factory=list)
+
+@dataclass
+class Dataset:
+    tenants: List[Tenant]
+    tokens: Dict[int, str]
+    emails: Dict[int, str]
+
+# ---- Local stubs for external services ----
+
+def stub_fetch_rates(base: str) -> Dict[str, float]:
+    base = base.upper()
+    if base not in USD_RATES:
+        return {}
+    return {ccy: rate / USD_RATES[base] for ccy, rate in USD_RATES.items()}
+
+def stub_country_currency(country_code: str):
+    return COUNTRY_CURRENCY.get(country_code.upper())
+
+def stub_tesseract(img, config: str = "") -> str:
+    return "ACME STORE\nCoffee 3.50\nSandwich 8.75\nTOTAL $12.25\n"
+
+@contextmanager
+def stub_external_services(real_ocr: bool = False):
+    """Replace network lookups (and optionally Tesseract) with local fakes."""
+    import backend.currency
+    import backend.main
+
+    patches = [
+        (backend.currency, "fetch_rates", stub_fetch_rates),
+        (backend.main, "get_company_currency_for_country", stub_country_currency),
+    ]
+    if not real_ocr:
+        import pytesseract
+        patches.append((pytesseract, "image_to_string", stub_tesseract))
+    saved = [(obj, name, getattr(obj, name)) for obj, name, _ in patches]
+    try:
+        for obj, name, fake in patches:
+            setattr(obj, name, fake)
+        yield
+    finally:
+        for obj, name, original in saved:
+            setattr(obj, name, original)
+
+# ---- Data generation ----
+
+def _user(company_id: int, email: str, role: models.Role, password_hash: str, manager_id=None, approver=False) -> models.User:
+    return models.User(
+        email=email,
+        full_name=email.split("@")[0].replace(".", " ").title(),
+        password_hash=password_hash,
+        role=role,
+        company_id=company_id,
+        manager_id=manager_id,
+        is_manager_approver=approver,
+    )
+
+def generate(db: Session, scale: Scale) -> Dataset:
+    """Populate `db` with synthetic companies and return handles for the load driver."""
+    rng = random.Random(scale.seed)
+    # bcrypt is deliberately slow; hash once and share it across every synthetic user.
+    password_hash = get_password_hash(BENCH_PASSWORD)
+    tenants: List[Tenant] = []
+    emails: Dict[int, str] = {}
+    countries = list(COUNTRY_CURRENCY)
+
+    for c in range(scale.companies):
+        country = countries[c % len(countries)]
+        company = models.Company(name=f"Bench Co {c}", country_code=country, currency_code=COUNTRY_CURRENCY[country])
+        db.add(company)
+        db.flush()
+
+        admin = _user(company.id, f"admin.{c}@bench.example.com", models.Role.admin, password_hash, approver=True)
+        db.add(admin)
+        db.flush()
+        tenant = Tenant(company_id=company.id, admin_id=admin.id)
+        emails[admin.id] = admin.email
+
+        # Manager tree: each level reports to a parent on the level above, rooted at the admin.
+        budget = max(scale.users_per_company - 1, 0)
+        level = [admin.id]
+        for depth in range(scale.manager_depth):
+            next_level = []
+            for parent in level:
+                for _ in range(scale.manager_fanout):
+                    if budget <= 0:
+                        break
+                    n = len(tenant.manager_ids)
+                    m = _user(company.id, f"mgr.{c}.{n}@bench.example.com", models.Role.manager, password_hash, manager_id=parent, approver=True)
+                    db.add(m)
+                    db.flush()
+                    tenant.manager_ids.append(m.id)
+                    emails[m.id] = m.email
+                    next_level.append(m.id)
+                    budget -= 1
+            if next_level:
+                level = next_level
+
+        employees = []
+        for e in range(budget):
+            emp = _user(company.id, f"emp.{c}.{e}@bench.example.com", models.Role.employee, password_hash, manager_id=rng.choice(level))
+            employees.append(emp)
+        db.add_all(employees)
+        db.flush()
+        for emp in employees:
+            tenant.employee_ids.append(emp.id)
+            emails[emp.id] = emp.email
+
+        rule_types = list(models.RuleType)
+        for r in range(scale.rules_per_company):
+            rtype = rule_types[r % len(rule_types)]
+            db.add(models.ApprovalRule(
+                company_id=company.id,
+                type=rtype,
+                threshold_percent=rng.choice([50, 60, 75, 100]) if rtype != models.RuleType.specific else None,
+                specific_user_id=rng.choice(tenant.manager_ids or [admin.id]) if rtype != models.RuleType.percentage else None,
+            ))
+
+        approvers = tenant.manager_ids or [admin.id]
+        submitters = tenant.employee_ids + tenant.manager_ids
+        for uid in submitters:
+            for _ in range(scale.expenses_per_user):
+                ccy = rng.choice(CURRENCIES)
+                amount = round(rng.uniform(5, 2500), 2)
+                exp = models.Expense(
+                    employee_id=uid,
+                    amount=amount,
+                    currency_code=ccy,
+                    normalized_amount=amount * stub_fetch_rates(ccy)[company.currency_code],
+                    category=rng.choice(CATEGORIES),
+                    description="synthetic",
+                    date=date(2024, 1, 1) + timedelta(days=rng.randrange(365)),
+                    status=models.ExpenseStatus.pending,
+                )
+                chain = rng.sample(approvers, min(scale.steps_per_expense, len(approvers)))
+                for seq, approver_id in enumerate(chain, start=1):
+                    exp.steps.append(models.ExpenseApprovalStep(approver_user_id=approver_id, sequence=seq))
+                db.add(exp)
+        db.flush()
+
+        for exp in db.query(models.Expense).options(selectinload(models.Expense.steps)).join(models.User, models.Expense.employee_id == models.User.id).filter(models.User.company_id == company.id):
+            tenant.expense_ids.append(exp.id)
+            tenant.expense_owner[exp.id] = exp.employee_id
+            for s in exp.steps:
+                tenant.pending.append((exp.id, s.approver_user_id))
+        tenants.append(tenant)
+
+    db.commit()
+    tokens = {uid: create_access_token({"sub": str(uid)}) for uid in emails}
+    return Dataset(tenants=tenants, tokens=tokens, emails=emails)
+
+@contextmanager
+def seeded_app(scale: Scale, real_ocr: bool = False):
+    """Yield `(app, dataset)` backed by a scratch SQLite database seeded at `scale`, with external services stubbed."""
+    from backend.main import app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"check_same_thread": False, "timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        def scratch_db():
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        with SessionLocal() as db:
+            data = generate(db, scale)
+        app.dependency_overrides[get_db] = scratch_db
+        try:
+            with stub_external_services(real_ocr=real_ocr):
+                yield app, data
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+            engine.dispose()
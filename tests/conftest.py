@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+
+# Always point the app at a scratch database before anything imports backend.database;
+# a DATABASE_URL already set in the shell may be a real one.
+_tmp = tempfile.mkdtemp(prefix="expense-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+
+import pytest
+from alembic import command
+from alembic.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _alembic_config(url: str) -> Config:
+    cfg = Config(os.path.join(ROOT, "alembic.ini"))
+    cfg.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    cfg.set_main_option("sqlalchemy.url", url)
+    cfg.attributes["configure_logger"] = False
+    return cfg
+
+@pytest.fixture
+def alembic_config():
+    """Build an Alembic config for the project's migrations against a given URL."""
+    return _alembic_config
+
+@pytest.fixture(scope="session", autouse=True)
+def migrated_database():
+    command.upgrade(_alembic_config(os.environ["DATABASE_URL"]), "head")
+    yield
+    from backend.database import engine
+    engine.dispose()
+    shutil.rmtree(_tmp, ignore_errors=True)
@@ -0,0 +1,53 @@
+from fastapi.routing import APIRoute
+from backend.main import app
+from benchmarks.load import STREAMING_ROUTES, build_workload, compare, percentile, run_benchmark
+from benchmarks.synthetic import Scale, seeded_app
+
+TINY = Scale(companies=2, users_per_company=8, manager_fanout=2, manager_depth=2, rules_per_company=2, expenses_per_user=2, steps_per_expense=2)
+
+def api_routes():
+    return {f"{m} {r.path}" for r in app.routes if isinstance(r, APIRoute) for m in r.methods}
+
+def test_benchmark_covers_every_route_without_errors():
+    report = run_benchmark(TINY, requests=3, concurrency=2)
+    assert set(report["endpoints"]) == api_routes() - STREAMING_ROUTES
+    for name, r in report["endpoints"].items():
+        assert r["count"] == 3, name
+        assert r["errors"] == 0, name
+        assert r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"]
+    assert report["meta"]["scale"]["companies"] == 2
+
+def test_percentile_and_compare():
+    assert percentile([], 50) == 0.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.5
+    assert percentile([1.0, 2.0], 100) == 2.0
+
+    base = {"endpoints": {"GET /auth/me": {"p50_ms": 10.0, "p95_ms": 20.0, "p99_ms": 30.0, "throughput_rps": 100.0, "errors": 0}}}
+    same = {"endpoints": {"GET /auth/me": {"p50_ms": 11.0, "p95_ms": 21.0, "p99_ms": 31.0, "throughput_rps": 95.0, "errors": 0}}}
+    slow = {"endpoints": {"GET /auth/me": {"p50_ms": 10.0, "p95_ms": 40.0, "p99_ms": 30.0, "throughput_rps": 50.0, "errors": 1}}}
+    assert compare(same, base, tolerance=0.2) == []
+    regressions = compare(slow, base, tolerance=0.2)
+    assert any("p95_ms" in r for r in regressions)
+    assert any("throughput_rps" in r for r in regressions)
+    assert any("errors" in r for r in regressions)
+
+def test_act_workload_never_repeats_a_decided_step():
+    with seeded_app(TINY) as (api, data):
+        act = build_workload(data)["POST /approvals/{expense_id}/act"]
+        pending = [p for t in data.tenants for p in t.pending]
+        calls = [act(i) for i in range(len(pending))]
+        assert len({c[1] + c[2]["headers"]["Authorization"] for c in calls}) == len(pending)
+        assert act(len(pending)) is None
+
+    report = run_benchmark(TINY, requests=len(pending) + 5, concurrency=2, only=["POST /approvals/{expense_id}/act"])
+    r = report["endpoints"]["POST /approvals/{expense_id}/act"]
+    assert (r["count"], r["errors"]) == (len(pending), 0)
+
+def test_steps_workload_reads_as_the_expense_owner():
+    with seeded_app(TINY) as (api, data):
+        steps = build_workload(data)["GET /expenses/{expense_id}/steps"]
+        owners = {eid: uid for t in data.tenants for eid, uid in t.expense_owner.items()}
+        for i in range(5):
+            _, path, kwargs = steps(i)
+            eid = int(path.split("/")[2])
+            assert kwargs["headers"]["Authorization"] == "Bearer " + data.tokens[owners[eid]]
@@ -0,0 +1,115 @@
+import io
+import random
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from PIL import Image, ImageDraw, ImageEnhance
+from backend import models
+from backend.database import Base
+from backend.dedup import BKTree, ReceiptIndex, hamming, to_signed64, to_unsigned64
+from backend.ocr import perceptual_hash
+from backend.profiling import profile_queries
+from benchmarks.synthetic import Scale, seeded_app
+
+def receipt(lines, size=(360, 520), barcode=False):
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((24, 24 + i * 36), line, fill="black")
+    draw.rectangle((16, 16, size[0] - 16, size[1] - 16), outline="black", width=3)
+    if barcode:
+        for x in range(40, size[0] - 40, 12):
+            draw.rectangle((x, size[1] - 140, x + 5, size[1] - 40), fill="black")
+    return img
+
+def png(img):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+def rephotographed(img):
+    # Different bytes, same receipt: rescaled, a little darker, JPEG round trip
+    img = ImageEnhance.Brightness(img.resize((330, 480))).enhance(0.9)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=70)
+    return Image.open(io.BytesIO(buf.getvalue())).convert("RGB")
+
+RECEIPT_A = ["ACME STORE", "Coffee 3.50", "Sandwich 8.75", "TOTAL $12.25"]
+RECEIPT_B = ["CITY TAXI", "Fare 40.00", "Tip 6.00", "TOTAL $46.00"]
+
+def test_bktree_matches_brute_force():
+    rng = random.Random(7)
+    base = [rng.getrandbits(64) for _ in range(40)]
+    hashes = [b ^ (1 << rng.randrange(64)) if i % 2 else b for i, b in enumerate(base * 5)]
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        tree.add(h, i)
+    assert len(tree) == len(hashes)
+    for q in base[:10]:
+        expected = sorted(i for i, h in enumerate(hashes) if hamming(q, h) <= 6)
+        assert sorted(i for i, _ in tree.search(q, 6)) == expected
+
+def test_signed_round_trip():
+    for h in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        assert -(1 << 63) <= to_signed64(h) < (1 << 63)
+        assert to_unsigned64(to_signed64(h)) == h
+
+def test_index_picks_up_rows_committed_out_of_order(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'index.db'}")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(models.Company(id=1, name="Acme", country_code="US", currency_code="USD"))
+    now = datetime.utcnow()
+    db.add(models.ReceiptHash(id=2, company_id=1, expense_id=20, phash=to_signed64(0xFF), created_at=now))
+    db.add(models.ReceiptHash(id=3, company_id=1, phash=to_signed64(0xFF), created_at=now))  # OCR preview only
+    db.commit()
+
+    index = ReceiptIndex()
+    assert index.near(db, 1, 0xFF, 0) == [(2, 0)]
+    # Id 1 was allocated first but its transaction committed after the last sync
+    db.add(models.ReceiptHash(id=1, company_id=1, expense_id=10, phash=to_signed64(0xFF), created_at=now - timedelta(seconds=1)))
+    db.commit()
+    assert sorted(index.near(db, 1, 0xFF, 0)) == [(1, 0), (2, 0)]
+    assert index.near(db, 2, 0xFF, 0) == []
+    db.close()
+
+def test_perceptual_hash_tolerates_rephotographing():
+    a = receipt(RECEIPT_A)
+    assert hamming(perceptual_hash(a), perceptual_hash(rephotographed(a))) <= 10
+    assert hamming(perceptual_hash(a), perceptual_hash(receipt(RECEIPT_B, barcode=True))) > 10
+
+def test_submission_flags_near_duplicate_receipt():
+    scale = Scale(companies=1, users_per_company=4, manager_fanout=1, manager_depth=1, expenses_per_user=0)
+    with seeded_app(scale) as (api, data):
+        client = TestClient(api)
+        emp = data.tenants[0].employee_ids[0]
+        headers = {"Authorization": "Bearer " + data.tokens[emp]}
+
+        def upload(img):
+            r = client.post("/ocr/parse", headers=headers, files={"file": ("r.png", png(img), "image/png")})
+            assert r.status_code == 200, r.text
+            return r.json()["receipt_id"]
+
+        def submit(receipt_id, amount=12.25, day="2024-03-01"):
+            r = client.post("/expenses", headers=headers, json={
+                "amount": amount, "currency_code": "USD", "category": "Meals", "date": day, "receipt_id": receipt_id})
+            assert r.status_code == 200, r.text
+            return r.json()
+
+        a = receipt(RECEIPT_A)
+        first = submit(upload(a))
+        assert first["duplicate_of_id"] is None
+
+        with profile_queries() as profiler:
+            again = submit(upload(rephotographed(a)))
+        profiler.assert_clean()
+        assert again["duplicate_of_id"] == first["id"]
+
+        assert submit(upload(rephotographed(a)), amount=99.0)["duplicate_of_id"] is None
+        assert submit(upload(rephotographed(a)), day="2024-03-02")["duplicate_of_id"] is None
+        assert submit(upload(receipt(RECEIPT_B, barcode=True)))["duplicate_of_id"] is None
+
+        r = client.post("/expenses", headers=headers, json={
+            "amount": 1, "currency_code": "USD", "category": "Meals", "date": "2024-03-01", "receipt_id": 10_000})
+        assert r.status_code == 404
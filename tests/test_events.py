@@ -0,0 +1,273 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import types
+from datetime import timedelta
+import httpx
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+from alembic import command
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from backend import events, main
+from backend.auth import STREAM_TICKET_EXPIRE_SECONDS, STREAM_TICKET_SCOPE, create_access_token
+from backend.events import Backend, EventHub, LocalBackend, RedisBackend, backend_from_env
+from benchmarks.synthetic import Scale, generate, seeded_app
+
+def test_hub_delivers_only_to_the_target_user():
+    async def scenario():
+        hub = EventHub(LocalBackend())
+        mine, other = hub.subscribe(1), hub.subscribe(2)
+        # Publishers are sync route handlers running on worker threads
+        t = threading.Thread(target=hub.publish, args=(1, "expense.updated", {"id": 7}))
+        t.start()
+        t.join()
+        frame = await mine.get(1.0)
+        assert frame == 'event: expense.updated\ndata: {"id": 7}\n\n'
+        assert await other.get(0.05) is None
+        hub.unsubscribe(1, mine)
+        assert hub.subscriber_count(1) == 0
+    asyncio.run(scenario())
+
+def test_slow_subscriber_is_told_to_resync(monkeypatch):
+    monkeypatch.setattr(events, "QUEUE_SIZE", 2)
+    monkeypatch.setattr(events, "hub", EventHub(LocalBackend()))
+
+    async def scenario():
+        stream = events.stream_events(5)
+        assert "event: ready" in await stream.__anext__()
+        for i in range(4):
+            events.hub.publish(5, "pending.updated", {"id": i})
+        await asyncio.sleep(0)
+        assert await stream.__anext__() == "event: resync\ndata: {}\n\n"
+        await stream.aclose()
+        assert events.hub.subscriber_count(5) == 0
+    asyncio.run(scenario())
+
+def test_events_backend_is_validated(monkeypatch):
+    monkeypatch.setenv("EVENTS_BACKEND", "redis-cluster.internal")
+    with pytest.raises(ValueError):
+        backend_from_env()
+    monkeypatch.setenv("EVENTS_BACKEND", "backend.events:LocalBackend")
+    assert isinstance(backend_from_env(), LocalBackend)
+
+class BrokenBackend(Backend):
+    def __init__(self, fail_start=False):
+        self.fail_start = fail_start
+        self.starts = 0
+
+    def start(self, deliver, lost):
+        self.starts += 1
+        if self.fail_start:
+            raise ConnectionError("backend unreachable")
+
+    def publish(self, user_id, message):
+        raise ConnectionError("backend unreachable")
+
+@pytest.mark.parametrize("fail_start", [False, True], ids=["publish", "start"])
+def test_failing_backend_does_not_fail_requests(monkeypatch, caplog, fail_start):
+    backend = BrokenBackend(fail_start)
+    monkeypatch.setattr(main, "hub", EventHub(backend))
+    scale = Scale(companies=1, users_per_company=4, manager_fanout=1, manager_depth=1, expenses_per_user=0)
+    with seeded_app(scale) as (api, data):
+        client = TestClient(api)
+        headers = {"Authorization": "Bearer " + data.tokens[data.tenants[0].employee_ids[0]]}
+        for _ in range(2):
+            r = client.post("/expenses", headers=headers, json={
+                "amount": 20.0, "currency_code": "USD", "category": "Meals", "date": "2024-05-01"})
+            assert r.status_code == 200, r.text
+        assert len(client.get("/expenses/my", headers=headers).json()) == 2
+        if fail_start:
+            assert "failed to start" in caplog.text
+            assert client.get("/events/stream", headers=headers).status_code == 503
+            # Backed off: one attempt for every publish and stream since
+            assert backend.starts == 1
+        else:
+            assert "Could not publish" in caplog.text
+
+class DyingBackend(LocalBackend):
+    """Local delivery whose listener can be killed, as a dropped Redis connection would."""
+
+    def __init__(self):
+        self.starts = 0
+
+    def start(self, deliver, lost):
+        super().start(deliver, lost)
+        self.starts += 1
+        self.kill = lambda: threading.Thread(target=lost, args=(ConnectionError("connection reset"),)).start()
+
+def test_hub_restarts_a_backend_whose_listener_died(monkeypatch):
+    backend = DyingBackend()
+    monkeypatch.setattr(events, "HEARTBEAT_SECONDS", 0.05)
+    monkeypatch.setattr(events, "hub", EventHub(backend))
+
+    async def scenario():
+        events.hub.start()
+        stream = events.stream_events(3)
+        assert "event: ready" in await stream.__anext__()
+        backend.kill()
+        while events.hub.started:
+            await asyncio.sleep(0.01)
+        # The open stream restarts the backend on its next heartbeat and is told it may have missed events
+        frames = [await stream.__anext__() for _ in range(2)]
+        assert "event: resync\ndata: {}\n\n" in frames
+        assert backend.starts == 2
+
+        backend.kill()
+        while events.hub.started:
+            await asyncio.sleep(0.01)
+        # ... as does the next publish, which is then delivered
+        await asyncio.to_thread(events.hub.publish, 3, "expense.updated", {"id": 1})
+        frames = [await stream.__anext__() for _ in range(2)]
+        assert frames == ["event: resync\ndata: {}\n\n", 'event: expense.updated\ndata: {"id": 1}\n\n']
+        assert backend.starts == 3
+        await stream.aclose()
+    asyncio.run(scenario())
+
+def test_redis_backend_times_out_and_cleans_up_a_failed_start(monkeypatch):
+    class FakeClient:
+        closed = False
+
+        def pubsub(self, **kwargs):
+            return self
+
+        def psubscribe(self, **handlers):
+            raise ConnectionError("redis unreachable")
+
+        def close(self):
+            self.closed = True
+
+    client, options = FakeClient(), {}
+
+    def from_url(url, **kwargs):
+        options.update(kwargs)
+        return client
+
+    monkeypatch.setitem(sys.modules, "redis", types.SimpleNamespace(Redis=types.SimpleNamespace(from_url=from_url)))
+    with pytest.raises(ConnectionError):
+        RedisBackend("redis://localhost:6379/0").start(lambda user_id, message: None, lambda exc: None)
+    assert client.closed
+    assert options["socket_connect_timeout"] and options["socket_timeout"]
+
+def test_stream_accepts_only_short_lived_tickets_in_the_url():
+    scale = Scale(companies=1, users_per_company=2, manager_fanout=1, manager_depth=1, expenses_per_user=0)
+    with seeded_app(scale) as (api, data):
+        client = TestClient(api)
+        uid = data.tenants[0].admin_id
+        token = data.tokens[uid]
+        ticket = client.post("/events/ticket", headers={"Authorization": "Bearer " + token}).json()
+        assert ticket["expires_in"] == STREAM_TICKET_EXPIRE_SECONDS
+
+        # The long-lived bearer token is never accepted from the query string
+        assert client.get("/events/stream", params={"token": token}).status_code == 401
+        assert client.get("/events/stream", params={"ticket": token}).status_code == 401
+        # ... and a ticket is no good as a bearer token, nor once it has expired
+        assert client.get("/auth/me", headers={"Authorization": "Bearer " + ticket["ticket"]}).status_code == 401
+        expired = create_access_token({"sub": str(uid), "scope": STREAM_TICKET_SCOPE}, timedelta(seconds=-1))
+        assert client.get("/events/stream", params={"ticket": expired}).status_code == 401
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def live_server():
+    scale = Scale(companies=1, users_per_company=4, manager_fanout=1, manager_depth=1, expenses_per_user=0)
+    with seeded_app(scale) as (api, data):
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(api, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        yield f"http://127.0.0.1:{port}", data
+        server.should_exit = True
+        thread.join(5)
+
+def read_events(lines, count):
+    found, event = [], None
+    for line in lines:
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            found.append((event, json.loads(line[len("data: "):])))
+            if len(found) == count:
+                return found
+    return found
+
+def test_stream_pushes_submission_and_decision(live_server):
+    base, data = live_server
+    tenant = data.tenants[0]
+    emp, mgr = tenant.employee_ids[0], tenant.manager_ids[0]
+
+    with httpx.Client(base_url=base, timeout=5) as client:
+        assert client.get("/events/stream").status_code == 401
+        r = client.post("/events/ticket", headers={"Authorization": "Bearer " + data.tokens[mgr]})
+        assert r.status_code == 200, r.text
+
+        with client.stream("GET", "/events/stream", params={"ticket": r.json()["ticket"]}) as mgr_stream, \
+             client.stream("GET", "/events/stream", headers={"Authorization": "Bearer " + data.tokens[emp]}) as emp_stream:
+            mgr_lines, emp_lines = mgr_stream.iter_lines(), emp_stream.iter_lines()
+            assert read_events(mgr_lines, 1)[0][0] == "ready"
+            assert read_events(emp_lines, 1)[0][0] == "ready"
+
+            r = client.post("/expenses", headers={"Authorization": "Bearer " + data.tokens[emp]}, json={
+                "amount": 20.0, "currency_code": "USD", "category": "Meals", "date": "2024-05-01"})
+            assert r.status_code == 200, r.text
+            expense_id = r.json()["id"]
+
+            [(event, payload)] = read_events(mgr_lines, 1)
+            assert (event, payload["id"], payload["status"]) == ("pending.updated", expense_id, "pending")
+            [(event, payload)] = read_events(emp_lines, 1)
+            assert (event, payload["id"]) == ("expense.updated", expense_id)
+
+            r = client.post(f"/approvals/{expense_id}/act", headers={"Authorization": "Bearer " + data.tokens[mgr]},
+                            json={"approve": True, "comment": "ok"})
+            assert r.status_code == 200, r.text
+
+            [(event, payload)] = read_events(mgr_lines, 1)
+            assert (event, payload) == ("pending.removed", {"id": expense_id})
+            [(event, payload)] = read_events(emp_lines, 1)
+            assert (event, payload["status"]) == ("expense.updated", r.json()["status"])
+
+def test_stopping_the_server_ends_open_streams(tmp_path, alembic_config):
+    url = f"sqlite:///{tmp_path / 'shutdown.db'}"
+    command.upgrade(alembic_config(url), "head")
+    engine = create_engine(url)
+    with Session(engine) as db:
+        data = generate(db, Scale(companies=1, users_per_company=2, manager_fanout=1, manager_depth=1, expenses_per_user=0))
+    engine.dispose()
+    token = data.tokens[data.tenants[0].admin_id]
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=main.__file__.rsplit(os.sep, 2)[0], env=dict(os.environ, DATABASE_URL=url),
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=10) as client:
+            for _ in range(200):
+                try:
+                    client.get("/docs")
+                    break
+                except httpx.ConnectError:
+                    time.sleep(0.05)
+            with client.stream("GET", "/events/stream", headers={"Authorization": "Bearer " + token}) as stream:
+                lines = stream.iter_lines()
+                assert read_events(lines, 1)[0][0] == "ready"
+                # What Ctrl+C (and the --reload supervisor's SIGTERM) does
+                server.send_signal(signal.SIGINT)
+                assert server.wait(timeout=5) == 0
+                assert read_events(lines, 1) == []  # the stream ended rather than hanging
+    finally:
+        if server.poll() is None:
+            server.kill()
+            server.wait()
@@ -0,0 +1,53 @@
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.profiling import QueryBudgetExceeded, QueryProfiler, RequestProfile, profile_queries, statement_shape
+from benchmarks.load import build_workload
+from benchmarks.synthetic import Scale, seeded_app
+
+SMALL = Scale(companies=1, users_per_company=6, manager_fanout=2, manager_depth=1, rules_per_company=1, expenses_per_user=1, steps_per_expense=1)
+LARGE = Scale(companies=3, users_per_company=40, manager_fanout=3, manager_depth=2, rules_per_company=3, expenses_per_user=4, steps_per_expense=5)
+
+def test_every_route_declares_a_budget():
+    for r in app.routes:
+        if isinstance(r, APIRoute):
+            assert hasattr(r.endpoint, "__query_budget__"), r.path
+
+@pytest.mark.parametrize("scale", [SMALL, LARGE], ids=["small", "large"])
+def test_routes_stay_within_query_budget(scale):
+    with seeded_app(scale) as (api, data), profile_queries() as profiler:
+        client = TestClient(api)
+        for name, factory in build_workload(data).items():
+            for i in range(3):
+                call = factory(i)
+                if call is None:
+                    break
+                method, path, kwargs = call
+                r = client.request(method, path, **kwargs)
+                assert r.status_code < 400, (name, r.text)
+        assert {p.route for p in profiler.profiles} == set(build_workload(data))
+        profiler.assert_clean()
+
+def test_profiler_flags_budget_and_repeated_shapes():
+    profiler = QueryProfiler(n_plus_one_threshold=3)
+    profiler(RequestProfile(route="GET /a", budget=2, statements=["SELECT 1", "SELECT 2"]))
+    assert profiler.report() == []
+
+    profiler(RequestProfile(route="GET /b", budget=2, statements=[
+        "SELECT * FROM users WHERE id = ?",
+        "SELECT *  FROM users\nWHERE id = ?",
+        "SELECT * FROM users WHERE id = ?",
+    ]))
+    assert [p.route for p in profiler.over_budget()] == ["GET /b"]
+    assert profiler.n_plus_one() == {"GET /b": {"SELECT * FROM users WHERE id = ?": 3}}
+    with pytest.raises(QueryBudgetExceeded):
+        profiler.assert_clean()
+
+def test_statement_shape_collapses_in_lists():
+    assert statement_shape("SELECT x FROM t WHERE id IN (?, ?, ?)") == statement_shape("SELECT x FROM t WHERE id IN (?)")
+    # psycopg2 (pyformat) and named/numeric paramstyles number each expanded parameter
+    assert statement_shape("SELECT x FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == statement_shape("SELECT x FROM t WHERE id IN (%(id_1_1)s)")
+    assert statement_shape("SELECT x FROM t WHERE id IN (:id_1_1, :id_1_2, :id_1_3)") == statement_shape("SELECT x FROM t WHERE id IN (:id_1_1)")
+    assert statement_shape("SELECT x FROM t WHERE id IN ($1, $2)") == statement_shape("SELECT x FROM t WHERE id IN (%s)")
+    assert statement_shape("SELECT x FROM t WHERE a = ? AND id IN (%(id_1_1)s)") != statement_shape("SELECT x FROM t WHERE b = ? AND id IN (%(id_1_1)s)")
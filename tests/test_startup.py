@@ -0,0 +1,24 @@
+import os
+import tempfile
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine
+from backend.database import Base
+from benchmarks.startup import run_startup
+
+def test_import_is_lazy_and_side_effect_free():
+    report = run_startup(runs=1)
+    assert report["heavy_modules_loaded"] == []
+    assert report["database_touched_on_import"] is False
+
+def test_migrations_match_models(alembic_config):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'migrated.db')}"
+        cfg = alembic_config(url)
+        command.upgrade(cfg, "head")
+        engine = create_engine(url)
+        with engine.connect() as conn:
+            assert compare_metadata(MigrationContext.configure(conn), Base.metadata) == []
+        command.downgrade(cfg, "base")
+        engine.dispose()